@@ -2,9 +2,14 @@ import attr
 import datetime
 import typing
 import operator
-import gurobipy as grb
 import collections
 
+try:
+    import gurobipy as grb
+except ImportError:
+    # rbs and the slot-filling heuristics need no solver; only the assignment models require gurobipy.
+    grb = None
+
 
 @attr.s(frozen=True, kw_only=True)
 class Slot(object):
@@ -92,6 +97,7 @@ class CostCompr(object):
 @attr.s(frozen=True, kw_only=True)
 class CostAssign(object):
     weighted = attr.ib(type=bool)
+    env = attr.ib(type=typing.Optional['grb.Env'], default=None, eq=False, repr=False)
 
     def __call__(self, flight: Flight, slot: Slot, flights: typing.Iterable[Flight],
                  assignments: typing.Dict[Flight, Slot],
@@ -104,7 +110,7 @@ class CostAssign(object):
         airlineflights = {f for f in flights if f.airline == flight.airline}
         airlineslots = get_airlineslots(assignment=assignments, airline=flight.airline)
         base_objval = build_assignmodel(slots=airlineslots.values(), flights=airlineflights,
-                                        weighted=self.weighted).getAttr("ObjVal")
+                                        weighted=self.weighted, env=self.env).getAttr("ObjVal")
         base_cost = datetime.timedelta(seconds=base_objval)
 
         open_slots = {assignments[flight]: flight.airline}
@@ -114,7 +120,7 @@ class CostAssign(object):
         assignment_copy = slotfiller(open_slots, assignment_copy)
         rr_airlineslots = get_airlineslots(assignment_copy, airline=flight.airline)
         rr_objval = build_assignmodel(slots=rr_airlineslots.values(), flights=airlineflights,
-                                      weighted=self.weighted).getAttr("ObjVal")
+                                      weighted=self.weighted, env=self.env).getAttr("ObjVal")
         rr_cost = datetime.timedelta(seconds=rr_objval)
         return rr_cost - base_cost
 
@@ -223,8 +229,11 @@ def rrvarname(flight: Flight):
 
 
 def build_assignmodel(slots: typing.Iterable[Slot], flights: typing.Iterable[Flight],
-                      weighted: bool = False, verbose: bool = False) -> grb.Model:
-    model = grb.Model()
+                      weighted: bool = False, verbose: bool = False,
+                      env: typing.Optional['grb.Env'] = None) -> 'grb.Model':
+    if grb is None:
+        raise ImportError("gurobipy is required to build assignment models")
+    model = grb.Model(env=env)
     if not verbose:
         model.setParam("OutputFlag", 0)
 
@@ -263,7 +272,7 @@ def build_assignmodel(slots: typing.Iterable[Slot], flights: typing.Iterable[Fli
     return model
 
 
-def read_assignment(slots: typing.Collection[Slot], flights: typing.Collection[Flight], model: grb.Model):
+def read_assignment(slots: typing.Collection[Slot], flights: typing.Collection[Flight], model: 'grb.Model'):
     assignments = {}
     for f in flights:
         for s in slots:
@@ -277,14 +286,49 @@ def read_assignment(slots: typing.Collection[Slot], flights: typing.Collection[F
 @attr.s(frozen=True, kw_only=True)
 class SysOpt(object):
     weighted = attr.ib(type=bool)
+    env = attr.ib(type=typing.Optional['grb.Env'], default=None, eq=False, repr=False)
 
     def __call__(self, slots: typing.Collection[Slot], flights: typing.Collection[Flight]) -> typing.Dict[Flight, Slot]:
-        grb_model = build_assignmodel(weighted=self.weighted, slots=slots, flights=flights)
+        grb_model = build_assignmodel(weighted=self.weighted, slots=slots, flights=flights, env=self.env)
         return read_assignment(model=grb_model, slots=slots, flights=flights)
 
 
+def standard_methods(env: typing.Optional['grb.Env'] = None,
+                     airline_cheats: bool = False) -> typing.Dict[str, typing.Callable]:
+    airline_cost_method = CostAssign(weighted=True, env=env)
+    return {'RBS': rbs,
+            'CTOP': CtopRunner(cost_method=cost_rtc,
+                               slotfiller=SlotFiller(compress=False),
+                               airline_cheats=airline_cheats,
+                               airline_cost_method=airline_cost_method),
+            'CMPR_RTC': CtopRunner(cost_method=cost_rtc,
+                                   slotfiller=SlotFiller(compress=True),
+                                   airline_cheats=airline_cheats,
+                                   airline_cost_method=airline_cost_method),
+            'CMPR_ONESTEP': CtopRunner(cost_method=CostCompr(weighted=False),
+                                       slotfiller=SlotFiller(compress=True),
+                                       airline_cheats=airline_cheats,
+                                       airline_cost_method=airline_cost_method),
+            'CMPR_W_ONESTEP': CtopRunner(cost_method=CostCompr(weighted=True),
+                                         slotfiller=SlotFiller(compress=True),
+                                         airline_cheats=airline_cheats,
+                                         airline_cost_method=airline_cost_method),
+            'CMPR_ASSIGN': CtopRunner(cost_method=CostAssign(weighted=False, env=env),
+                                      slotfiller=SlotFiller(compress=True),
+                                      airline_cheats=airline_cheats,
+                                      airline_cost_method=airline_cost_method),
+            'CMPR_WASSIGN': CtopRunner(cost_method=CostAssign(weighted=True, env=env),
+                                       slotfiller=SlotFiller(compress=True),
+                                       airline_cheats=airline_cheats,
+                                       airline_cost_method=airline_cost_method),
+            'SYSOPT': SysOpt(weighted=False, env=env),
+            'WSYSOPT': SysOpt(weighted=True, env=env)
+            }
+
+
 def apply_swaps(flights: typing.Collection[Flight],
-                assignments: typing.Dict[Flight, Slot]):
+                assignments: typing.Dict[Flight, Slot],
+                env: typing.Optional['grb.Env'] = None):
     airlineflightdict = collections.defaultdict(set)
     for f in flights:
         airlineflightdict[f.airline].add(f)
@@ -296,7 +340,7 @@ def apply_swaps(flights: typing.Collection[Flight],
     newassignment = {}
     for airline, f in airlineflightdict.items():
         airlineslots = airlineslotdict[airline]
-        model = build_assignmodel(weighted=True, slots=airlineslots, flights=f)
+        model = build_assignmodel(weighted=True, slots=airlineslots, flights=f, env=env)
         newassignment.update(read_assignment(model=model, slots=airlineslots, flights=f))
     return newassignment
 
@@ -0,0 +1,388 @@
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import datetime
+import itertools
+import json
+import queue
+import typing
+
+import attr
+
+import bctop.allocations as allocations
+from bctop.allocations import grb
+
+# Requests and responses are single-line JSON objects, one per line. Every request carries an "id" that is
+# echoed back in the response, so a client may keep several requests in flight on one connection.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+STREAM_LIMIT = 2 ** 26
+REQUEST_ERRORS = (KeyError, ValueError, TypeError) + ((grb.GurobiError,) if grb is not None else ())
+
+
+def flight_from_dict(data: typing.Dict) -> allocations.Flight:
+    return allocations.Flight(fid=data['fid'],
+                              airline=data['airline'],
+                              deptime=datetime.datetime.fromisoformat(data['deptime']),
+                              flight_duration=datetime.timedelta(seconds=data['flight_duration']),
+                              rtc=datetime.timedelta(seconds=data['rtc']),
+                              weight=float(data.get('weight', 1.0)))
+
+
+def slot_from_dict(data: typing.Dict) -> allocations.Slot:
+    return allocations.Slot(sid=data['sid'], time=datetime.datetime.fromisoformat(data['time']))
+
+
+def assignment_cost(assignment: typing.Dict[allocations.Flight, allocations.Slot],
+                    flights: typing.Iterable[allocations.Flight],
+                    weighted: bool = False) -> typing.Dict[str, float]:
+    gd = 0.0
+    rrcost = 0.0
+    for f in flights:
+        weight = f.weight if weighted else 1.0
+        if f in assignment:
+            gd += weight * allocations.assigndelay(slot=assignment[f], flight=f).total_seconds()
+        else:
+            rrcost += weight * f.rtc.total_seconds()
+    return {'GD': gd, 'RRCOST': rrcost, 'TOTALGDE': gd + rrcost}
+
+
+@attr.s(frozen=True, kw_only=True)
+class Instance(object):
+    slots = attr.ib(type=typing.FrozenSet[allocations.Slot])
+    flights = attr.ib(type=typing.FrozenSet[allocations.Flight])
+    slots_by_id = attr.ib(type=typing.Dict[str, allocations.Slot])
+    flights_by_id = attr.ib(type=typing.Dict[str, allocations.Flight])
+
+    @classmethod
+    def build(cls, slots: typing.Iterable[allocations.Slot], flights: typing.Iterable[allocations.Flight]):
+        slots_by_id = {}
+        for s in slots:
+            if str(s.sid) in slots_by_id:
+                raise ValueError("Duplicate slot id: " + str(s.sid))
+            slots_by_id[str(s.sid)] = s
+        flights_by_id = {}
+        for f in flights:
+            if str(f.fid) in flights_by_id:
+                raise ValueError("Duplicate flight id: " + str(f.fid))
+            flights_by_id[str(f.fid)] = f
+        return cls(slots=frozenset(slots_by_id.values()),
+                   flights=frozenset(flights_by_id.values()),
+                   slots_by_id=slots_by_id,
+                   flights_by_id=flights_by_id)
+
+    def parse_assignment(self, assignment: typing.Dict[str, str]) -> typing.Dict[allocations.Flight, allocations.Slot]:
+        if not isinstance(assignment, dict):
+            raise ValueError("Assignment must map flight ids to slot ids")
+        parsed = {}
+        used_slots = set()
+        for fid, sid in assignment.items():
+            if str(fid) not in self.flights_by_id:
+                raise ValueError("Unknown flight id: " + str(fid))
+            if str(sid) not in self.slots_by_id:
+                raise ValueError("Unknown slot id: " + str(sid))
+            flight = self.flights_by_id[str(fid)]
+            slot = self.slots_by_id[str(sid)]
+            if not allocations.isfeasible(slot=slot, flight=flight):
+                raise ValueError("Slot " + str(sid) + " is earlier than the arrival time of flight " + str(fid))
+            if slot in used_slots:
+                raise ValueError("Slot " + str(sid) + " is assigned to more than one flight")
+            used_slots.add(slot)
+            parsed[flight] = slot
+        return parsed
+
+    def dump_assignment(self, assignment: typing.Dict[allocations.Flight, allocations.Slot]) -> typing.Dict:
+        return {'assignment': {str(f.fid): str(s.sid) for f, s in assignment.items()},
+                'rerouted': sorted(str(f.fid) for f in self.flights if f not in assignment)}
+
+
+@attr.s(frozen=True, kw_only=True)
+class Worker(object):
+    env = attr.ib(type=typing.Optional['grb.Env'])
+    methods = attr.ib(type=typing.Dict[str, typing.Callable])
+    cheat_methods = attr.ib(type=typing.Dict[str, typing.Callable])
+
+
+def start_env() -> typing.Optional['grb.Env']:
+    # Without gurobipy only the solver-free methods are served, and they need no environment.
+    if grb is None:
+        return None
+    env = grb.Env(empty=True)
+    env.setParam("OutputFlag", 0)
+    env.start()
+    return env
+
+
+class EnvPool(object):
+    # Gurobi environments are not safe to share between threads, so each running job checks one out.
+    workers: queue.Queue
+
+    def __init__(self, size: int):
+        self.workers = queue.Queue()
+        for _ in range(size):
+            env = start_env()
+            self.workers.put(Worker(env=env,
+                                    methods=allocations.standard_methods(env=env, airline_cheats=False),
+                                    cheat_methods=allocations.standard_methods(env=env, airline_cheats=True)))
+
+    @contextlib.contextmanager
+    def checkout(self) -> typing.Iterator[Worker]:
+        worker = self.workers.get()
+        try:
+            yield worker
+        finally:
+            self.workers.put(worker)
+
+    def close(self):
+        while not self.workers.empty():
+            env = self.workers.get_nowait().env
+            if env is not None:
+                env.dispose()
+
+
+class AllocationService(object):
+    instances: typing.Dict[str, Instance]
+    pool: EnvPool
+    executor: concurrent.futures.ThreadPoolExecutor
+
+    def __init__(self, num_workers: int = 4):
+        self.instances = {}
+        self.pool = EnvPool(size=num_workers)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+        self.handlers = {'ping': self.ping,
+                         'load_instance': self.load_instance,
+                         'drop_instance': self.drop_instance,
+                         'allocate': self.allocate,
+                         'evaluate': self.evaluate,
+                         'swap': self.swap}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+    def get_instance(self, instance_id: str) -> Instance:
+        if instance_id not in self.instances:
+            raise KeyError("Unknown instance: " + str(instance_id))
+        return self.instances[instance_id]
+
+    async def run_blocking(self, func: typing.Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def ping(self) -> str:
+        return 'pong'
+
+    async def load_instance(self, instance_id: str, slots: typing.List[typing.Dict],
+                            flights: typing.List[typing.Dict]) -> typing.Dict:
+        instance = Instance.build(slots=[slot_from_dict(s) for s in slots],
+                                  flights=[flight_from_dict(f) for f in flights])
+        self.instances[instance_id] = instance
+        return {'instance_id': instance_id, 'num_slots': len(instance.slots), 'num_flights': len(instance.flights)}
+
+    async def drop_instance(self, instance_id: str) -> bool:
+        return self.instances.pop(instance_id, None) is not None
+
+    async def allocate(self, instance_id: str, method: str, airline_cheats: bool = False,
+                       postswap: bool = False) -> typing.Dict:
+        instance = self.get_instance(instance_id)
+
+        def job():
+            with self.pool.checkout() as worker:
+                methods = worker.cheat_methods if airline_cheats else worker.methods
+                if method not in methods:
+                    raise KeyError("Unknown method: " + str(method))
+                assignment = methods[method](slots=instance.slots, flights=instance.flights)
+                if postswap:
+                    assignment = allocations.apply_swaps(flights=instance.flights, assignments=assignment,
+                                                         env=worker.env)
+            return assignment
+
+        assignment = await self.run_blocking(job)
+        result = instance.dump_assignment(assignment)
+        result['cost'] = assignment_cost(assignment, instance.flights, weighted=False)
+        result['wcost'] = assignment_cost(assignment, instance.flights, weighted=True)
+        return result
+
+    async def evaluate(self, instance_id: str, assignment: typing.Dict[str, str]) -> typing.Dict:
+        instance = self.get_instance(instance_id)
+        parsed = instance.parse_assignment(assignment)
+        return {'cost': assignment_cost(parsed, instance.flights, weighted=False),
+                'wcost': assignment_cost(parsed, instance.flights, weighted=True)}
+
+    async def swap(self, instance_id: str, assignment: typing.Dict[str, str]) -> typing.Dict:
+        instance = self.get_instance(instance_id)
+        parsed = instance.parse_assignment(assignment)
+
+        def job():
+            with self.pool.checkout() as worker:
+                return allocations.apply_swaps(flights=instance.flights, assignments=parsed, env=worker.env)
+
+        swapped = await self.run_blocking(job)
+        result = instance.dump_assignment(swapped)
+        result['cost'] = assignment_cost(swapped, instance.flights, weighted=False)
+        result['wcost'] = assignment_cost(swapped, instance.flights, weighted=True)
+        return result
+
+    async def dispatch(self, request: typing.Any) -> typing.Dict:
+        # Every request line gets exactly one response, whatever goes wrong while handling it.
+        if not isinstance(request, dict):
+            return {'id': None, 'ok': False, 'error': "Request must be a JSON object"}
+        request = dict(request)
+        request_id = request.pop('id', None)
+        try:
+            op = request.pop('op', None)
+            if not isinstance(op, str) or op not in self.handlers:
+                return {'id': request_id, 'ok': False, 'error': "Unknown op: " + str(op)}
+            result = await self.handlers[op](**request)
+        except REQUEST_ERRORS as e:
+            return {'id': request_id, 'ok': False, 'error': type(e).__name__ + ": " + str(e)}
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': "Internal error: " + type(e).__name__ + ": " + str(e)}
+        return {'id': request_id, 'ok': True, 'result': result}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(line: bytes):
+            try:
+                response = await self.dispatch(json.loads(line))
+            except ValueError as e:
+                response = {'id': None, 'ok': False, 'error': type(e).__name__ + ": " + str(e)}
+            async with write_lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError) as e:
+                    # The rest of an overlong line cannot be framed, so answer once and drop the connection.
+                    async with write_lock:
+                        writer.write(json.dumps({'id': None, 'ok': False,
+                                                 'error': "Request line too long: " + str(e)}).encode() + b'\n')
+                        await writer.drain()
+                    break
+                if not line:
+                    break
+                task = asyncio.ensure_future(respond(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    path: str = None, limit: int = STREAM_LIMIT) -> asyncio.AbstractServer:
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path=path, limit=limit)
+        return await asyncio.start_server(self.handle_connection, host=host, port=port, limit=limit)
+
+
+class AllocationClient(object):
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    futures: typing.Dict[int, asyncio.Future]
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.futures = {}
+        self.counter = itertools.count()
+        self.listener = asyncio.ensure_future(self.listen())
+
+    @classmethod
+    async def connect(cls, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: str = None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path=path, limit=STREAM_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(host=host, port=port, limit=STREAM_LIMIT)
+        return cls(reader, writer)
+
+    async def listen(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.futures.pop(response['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to allocation service closed"))
+            self.futures.clear()
+
+    async def request(self, op: str, **kwargs):
+        if self.listener.done():
+            raise ConnectionError("Connection to allocation service closed")
+        request_id = next(self.counter)
+        future = asyncio.get_running_loop().create_future()
+        self.futures[request_id] = future
+        kwargs.update(id=request_id, op=op)
+        try:
+            self.writer.write(json.dumps(kwargs).encode() + b'\n')
+            await self.writer.drain()
+            response = await future
+        finally:
+            self.futures.pop(request_id, None)
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    async def load_instance(self, instance_id: str, slots: typing.Iterable[allocations.Slot],
+                            flights: typing.Iterable[allocations.Flight]):
+        return await self.request('load_instance', instance_id=instance_id,
+                                  slots=[{'sid': str(s.sid), 'time': s.time.isoformat()} for s in slots],
+                                  flights=[{'fid': str(f.fid),
+                                            'airline': f.airline,
+                                            'deptime': f.deptime.isoformat(),
+                                            'flight_duration': f.flight_duration.total_seconds(),
+                                            'rtc': f.rtc.total_seconds(),
+                                            'weight': float(f.weight)} for f in flights])
+
+    async def allocate(self, instance_id: str, method: str, airline_cheats: bool = False, postswap: bool = False):
+        return await self.request('allocate', instance_id=instance_id, method=method,
+                                  airline_cheats=airline_cheats, postswap=postswap)
+
+    async def evaluate(self, instance_id: str, assignment: typing.Dict[str, str]):
+        return await self.request('evaluate', instance_id=instance_id, assignment=assignment)
+
+    async def swap(self, instance_id: str, assignment: typing.Dict[str, str]):
+        return await self.request('swap', instance_id=instance_id, assignment=assignment)
+
+    async def close(self):
+        self.writer.close()
+        await self.listener
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: str = None, num_workers: int = 4):
+    service = AllocationService(num_workers=num_workers)
+    server = await service.start(host=host, port=port, path=path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Resident CTOP allocation service")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', default=None, help="Serve on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(serve(host=args.host, port=args.port, path=args.unix, num_workers=args.workers))
@@ -0,0 +1,106 @@
+import attr
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import types
+import typing
+
+import pandas
+
+
+def file_digest(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_digest(*objects: typing.Any) -> str:
+    digest = hashlib.sha256()
+    for obj in objects:
+        digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()
+
+
+def qualified_name(obj: typing.Any) -> str:
+    name = obj.__module__ + '.' + obj.__qualname__
+    if '<lambda>' in name or '<locals>' in name:
+        raise ValueError("Cannot build a stable checkpoint key for " + name + "; define it at module level")
+    return name
+
+
+def method_spec(method: typing.Any) -> typing.Any:
+    # A stable description of a configured method. Lambdas, closures and objects whose repr holds a memory address
+    # are rejected, since their key would either collide with another method or never match again.
+    # attrs fields declared with eq=False (e.g. solver environments) do not affect results and are left out.
+    if attr.has(type(method)):
+        spec = {'type': qualified_name(type(method))}
+        for field in attr.fields(type(method)):
+            if field.eq:
+                spec[field.name] = method_spec(getattr(method, field.name))
+        return spec
+    if isinstance(method, (types.FunctionType, types.BuiltinFunctionType, type)):
+        return qualified_name(method)
+    if method is None or isinstance(method, (bool, int, float, str)):
+        return method
+    text = repr(method)
+    if ' at 0x' in text:
+        raise ValueError("Cannot build a stable checkpoint key for " + text)
+    return text
+
+
+def unit_payload(**components) -> str:
+    return json.dumps(components, sort_keys=True, default=str)
+
+
+def unit_key(**components) -> str:
+    return hashlib.sha256(unit_payload(**components).encode()).hexdigest()
+
+
+def atomic_write(filename: str, write: typing.Callable[[typing.TextIO], None]):
+    # Write to a temporary file in the same directory and rename, so an interrupted run never leaves a
+    # partial file behind that a restart would mistake for a completed unit.
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as outfile:
+            write(outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmpname, filename)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+@attr.s(frozen=True, kw_only=True)
+class ResultStore(object):
+    root = attr.ib(type=str)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + '.csv')
+
+    def record_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def load(self, key: str) -> pandas.DataFrame:
+        return pandas.read_csv(self.path(key), index_col=0, dtype=str, keep_default_na=False)
+
+    def load_record(self, key: str) -> typing.Dict:
+        with open(self.record_path(key)) as infile:
+            return json.load(infile)
+
+    def save(self, key: str, frame: pandas.DataFrame, components: typing.Dict):
+        # The inputs are written next to the result so the store can be audited; the .csv goes last because
+        # its presence is what marks the unit as complete.
+        if unit_key(**components) != key:
+            raise ValueError("Unit components do not hash to key " + key)
+        atomic_write(self.record_path(key), lambda outfile: outfile.write(unit_payload(**components)))
+        atomic_write(self.path(key), frame.to_csv)
@@ -14,6 +14,7 @@ import numpy.random  as npr
 import collections
 
 import context
+import checkpoint
 import bctop.allocations
 
 
@@ -48,7 +49,8 @@ def normalize_weights(flights: typing.Set[bctop.allocations.Flight]) -> typing.S
 
 def read_flights(filename: str, basetime: datetime.datetime,
                  rtc_dist: sps.rv_continuous,
-                 weight_dist: sps.rv_continuous):
+                 weight_dist: sps.rv_continuous,
+                 random_state: npr.RandomState = None):
     test_data = pandas.read_excel(io=filename, index_row=None)
     flights = set()
     for row in test_data.itertuples():
@@ -56,8 +58,8 @@ def read_flights(filename: str, basetime: datetime.datetime,
         airline = row.Airline
         departtime = basetime + datetime.timedelta(minutes=row.DT)
         duration = datetime.timedelta(minutes=row.FCA) - datetime.timedelta(minutes=row.DT)
-        rtc = datetime.timedelta(seconds=float(rtc_dist.rvs(size=1)))
-        weight = float(weight_dist.rvs(size=1))
+        rtc = datetime.timedelta(seconds=float(rtc_dist.rvs(size=1, random_state=random_state)))
+        weight = float(weight_dist.rvs(size=1, random_state=random_state))
         flights.add(bctop.allocations.Flight(fid=fid,
                                              airline=airline,
                                              deptime=departtime,
@@ -132,8 +134,67 @@ def form_column(assignments, flights,
     return pandas.Series(col)
 
 
+def method_frame(assignment, flights, name: str) -> pandas.DataFrame:
+    frame = pandas.DataFrame()
+    frame['SLOTTIME_' + name] = form_column(assignment, flights, SlotAttrGetter(attrname='time'),
+                                            ConstantVal(value='NONE'))
+    frame['SLOTID_' + name] = form_column(assignment, flights, SlotAttrGetter(attrname='sid'),
+                                          ConstantVal(value='NONE'))
+    frame['GD_' + name] = form_column(assignment, flights, assigned_getter=GroundDelayParser(weighted=False),
+                                      unassigned_getter=ConstantVal(value=0))
+    frame['RRCOST_' + name] = form_column(assignment, flights,
+                                          assigned_getter=ConstantVal(value=0),
+                                          unassigned_getter=RrCostParser(weighted=False)
+                                          )
+    frame['TOTALGDE_' + name] = form_column(assignment, flights, assigned_getter=GroundDelayParser(weighted=False),
+                                            unassigned_getter=RrCostParser(weighted=False))
+    frame['WGD_' + name] = form_column(assignment, flights, assigned_getter=GroundDelayParser(weighted=True),
+                                       unassigned_getter=ConstantVal(value=0))
+    frame['WRRCOST_' + name] = form_column(assignment, flights,
+                                           assigned_getter=ConstantVal(value=0),
+                                           unassigned_getter=RrCostParser(weighted=True)
+                                           )
+    frame['WTOTALGDE_' + name] = form_column(assignment, flights, assigned_getter=GroundDelayParser(weighted=True),
+                                             unassigned_getter=RrCostParser(weighted=True))
+    return frame
+
+
+def code_fingerprint() -> typing.Dict[str, str]:
+    # Part of every checkpoint key, so editing the allocation code or the instance generation and result
+    # formatting below invalidates the stored units they produced.
+    return {'allocations': checkpoint.file_digest(bctop.allocations.__file__),
+            'generation': checkpoint.source_digest(read_flights, normalize_weights, generate_slots,
+                                                   flights_to_pd, flight_to_dict, form_column, method_frame,
+                                                   ConstantVal, SlotAttrGetter, GroundDelayParser, RrCostParser)}
+
+
+def trial_units(methods: typing.Dict[str, typing.Callable], trial: int, postswap: bool,
+                trial_params: typing.Dict) -> typing.Dict[str, typing.Dict]:
+    return {name: dict(trial=trial, method=checkpoint.method_spec(m), postswap=postswap, **trial_params)
+            for name, m in methods.items()}
+
+
+def run_trial(store: checkpoint.ResultStore, methods: typing.Dict[str, typing.Callable],
+              units: typing.Dict[str, typing.Dict], flights, slots, postswap: bool) -> pandas.DataFrame:
+    keys = {name: checkpoint.unit_key(**unit) for name, unit in units.items()}
+    for name, key in keys.items():
+        if store.has(key):
+            continue
+        assignment = methods[name](flights=flights, slots=slots)
+        if(postswap):
+            assignment = bctop.allocations.apply_swaps(flights=flights, assignments=assignment)
+        store.save(key, method_frame(assignment, flights, name), units[name])
+
+    outframe = flights_to_pd(flights)
+    for name, key in keys.items():
+        unit_frame = store.load(key).reindex([str(fid) for fid in outframe.index])
+        unit_frame.index = outframe.index
+        outframe = outframe.join(unit_frame)
+    return outframe
+
+
 if __name__ == '__main__':
-    npr.seed(1)
+    seed = 1
     infilename = os.path.join(context.DATA_PATH, 'Scenario_W0.25BP2C60Q2D5.xlsx')
     myslots_perhour = 30
     rtc_dist_params = {'c': 0.2, 'loc': 0, 'scale': 60 * 90}
@@ -144,6 +205,7 @@ if __name__ == '__main__':
     outfoldername = os.path.join(context.DATA_PATH, 'test_out_4')
     airline_cheats = True
     postswap=True
+    os.makedirs(outfoldername, exist_ok=True)
     with open(os.path.join(outfoldername, 'param_record.txt'), 'w') as paramfile:
         paramfile.write("RTC Distribution: Triangular, " + str(rtc_dist_params) + "\n")
         paramfile.write("RTC Distribution: Weight, " + str(weight_dist_params) + "\n")
@@ -151,91 +213,36 @@ if __name__ == '__main__':
         paramfile.write("Airline Cheats: " + str(airline_cheats) + "\n")
         paramfile.write("Postswap: " + str(postswap) + "\n")
 
-        paramfile.write("Seed: "+str(1))
+        paramfile.write("Seed: "+str(seed))
 
     mybasetime = datetime.datetime(year=1970, month=1, day=1, hour=0, minute=0, second=0)
-    methods = {'RBS': bctop.allocations.rbs,
-               'CTOP': bctop.allocations.CtopRunner(cost_method=bctop.allocations.cost_rtc,
-                                                    slotfiller=bctop.allocations.SlotFiller(compress=False),
-                                                    airline_cheats=airline_cheats,
-                                                    airline_cost_method=bctop.allocations.CostAssign(weighted=True),
-                                                    ),
-               'CMPR_RTC': bctop.allocations.CtopRunner(cost_method=bctop.allocations.cost_rtc,
-                                                        slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                        airline_cheats=airline_cheats,
-                                                        airline_cost_method=bctop.allocations.CostAssign(weighted=True)
-                                                        ),
-               'CMPR_ONESTEP': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                            cost_method=bctop.allocations.CostCompr(weighted=False),
-                                                            airline_cheats=airline_cheats,
-                                                            airline_cost_method=bctop.allocations.CostAssign(
-                                                                weighted=True)
-                                                            ),
-               'CMPR_W_ONESTEP': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                              cost_method=bctop.allocations.CostCompr(weighted=True),
-                                                              airline_cheats=airline_cheats,
-                                                              airline_cost_method=bctop.allocations.CostAssign(
-                                                                  weighted=True)
-                                                              ),
-               'CMPR_ASSIGN': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                           cost_method=bctop.allocations.CostAssign(weighted=False),
-                                                           airline_cheats=airline_cheats,
-                                                           airline_cost_method=bctop.allocations.CostAssign(
-                                                               weighted=True)
-                                                           ),
-               'CMPR_WASSIGN': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                            cost_method=bctop.allocations.CostAssign(weighted=True),
-                                                            airline_cheats=airline_cheats,
-                                                            airline_cost_method=bctop.allocations.CostAssign(
-                                                                weighted=True)
-                                                            ),
-
-               'SYSOPT': bctop.allocations.SysOpt(weighted=False),
-               'WSYSOPT': bctop.allocations.SysOpt(weighted=True)
-               }
+    slot_start = mybasetime + datetime.timedelta(seconds=60 * 60 * 16)
+    slot_end = mybasetime + datetime.timedelta(seconds=60 * 60 * 36)
+    methods = bctop.allocations.standard_methods(airline_cheats=airline_cheats)
 
     num_trials: int = 100
 
+    # Every (scenario, parameters, seed, trial, method) unit is stored under a hash of its inputs, so a restarted
+    # or partially reconfigured run only recomputes the units whose inputs are new.
+    store = checkpoint.ResultStore(root=os.path.join(outfoldername, 'units'))
+    trial_params = {'scenario': checkpoint.file_digest(infilename),
+                    'code': code_fingerprint(),
+                    'basetime': mybasetime,
+                    'rtc_dist': {'family': myrtc_dist.dist.name, 'params': rtc_dist_params},
+                    'weight_dist': {'family': myweight_dist.dist.name, 'params': weight_dist_params},
+                    'slots_perhour': myslots_perhour,
+                    'slot_start': slot_start,
+                    'slot_end': slot_end,
+                    'seed': seed}
+
     for i in range(0, num_trials):
         print(i)
+        # Each trial draws from its own stream so that it can be regenerated without replaying earlier trials.
         myflights = normalize_weights(read_flights(filename=infilename, basetime=mybasetime,
                                                    rtc_dist=myrtc_dist,
-                                                   weight_dist=myweight_dist))
-        outframe = flights_to_pd(myflights)
-        myslots = generate_slots(start=mybasetime + datetime.timedelta(seconds=60 * 60 * 16),
-                                 end=mybasetime + datetime.timedelta(seconds=60 * 60 * 36),
-                                 slots_perhour=30)
-        for name, m in methods.items():
-            assignment = m(flights=myflights, slots=myslots)
-            if(postswap):
-                assignment = bctop.allocations.apply_swaps(flights=myflights, assignments=assignment)
-
-            slot_id_col = form_column(assignment, myflights, SlotAttrGetter(attrname='sid'), ConstantVal(value='NONE'))
-            slot_time_col = form_column(assignment, myflights, SlotAttrGetter(attrname='time'),
-                                        ConstantVal(value='NONE'))
-            gd_col = form_column(assignment, myflights, assigned_getter=GroundDelayParser(weighted=False),
-                                 unassigned_getter=ConstantVal(value=0))
-            rr_col = form_column(assignment, myflights,
-                                 assigned_getter=ConstantVal(value=0),
-                                 unassigned_getter=RrCostParser(weighted=False)
-                                 )
-            total_col = form_column(assignment, myflights, assigned_getter=GroundDelayParser(weighted=False),
-                                    unassigned_getter=RrCostParser(weighted=False))
-            wgd_col = form_column(assignment, myflights, assigned_getter=GroundDelayParser(weighted=True),
-                                  unassigned_getter=ConstantVal(value=0))
-            wrr_col = form_column(assignment, myflights,
-                                  assigned_getter=ConstantVal(value=0),
-                                  unassigned_getter=RrCostParser(weighted=True)
-                                  )
-            wtotal_col = form_column(assignment, myflights, assigned_getter=GroundDelayParser(weighted=True),
-                                     unassigned_getter=RrCostParser(weighted=True))
-
-            outframe['SLOTTIME_' + name] = slot_time_col
-            outframe['SLOTID_' + name] = slot_id_col
-            outframe['GD_' + name] = gd_col
-            outframe['RRCOST_' + name] = rr_col
-            outframe['TOTALGDE_' + name] = total_col
-            outframe['WGD_' + name] = wgd_col
-            outframe['WRRCOST_' + name] = wrr_col
-            outframe['WTOTALGDE_' + name] = wtotal_col
-            outframe.to_csv(os.path.join(outfoldername, 'trial' + str(i) + '.csv'), index=False)
+                                                   weight_dist=myweight_dist,
+                                                   random_state=npr.RandomState([seed, i])))
+        myslots = generate_slots(start=slot_start, end=slot_end, slots_perhour=myslots_perhour)
+        units = trial_units(methods, trial=i, postswap=postswap, trial_params=trial_params)
+        outframe = run_trial(store, methods, units, flights=myflights, slots=myslots, postswap=postswap)
+        outframe.to_csv(os.path.join(outfoldername, 'trial' + str(i) + '.csv'), index=False)
@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+import tempfile
+
+import attr
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+import context
+import bctop.allocations
+import checkpoint
+import fullrun
+import instance_def
+
+
+def cost_fn(*_, **__):
+    return 0
+
+
+@attr.s(frozen=True, kw_only=True)
+class Method(object):
+    weighted = attr.ib(type=bool)
+    cost_method = attr.ib()
+    env = attr.ib(default=None, eq=False, repr=False)
+
+
+@attr.s(frozen=True, kw_only=True)
+class Counted(object):
+    method = attr.ib()
+    calls = attr.ib(factory=list, eq=False, repr=False)
+
+    def __call__(self, slots, flights):
+        self.calls.append(1)
+        return self.method(slots=slots, flights=flights)
+
+
+class InterruptedWrite(Exception):
+    pass
+
+
+def expect_value_error(method):
+    try:
+        checkpoint.method_spec(method)
+    except ValueError:
+        return
+    raise AssertionError("No error for unstable method " + repr(method))
+
+
+def check_keys():
+    first = checkpoint.method_spec(Method(weighted=True, cost_method=cost_fn))
+    second = checkpoint.method_spec(Method(weighted=True, cost_method=cost_fn, env=object()))
+    assert first == second
+    assert first != checkpoint.method_spec(Method(weighted=False, cost_method=cost_fn))
+    assert {name: checkpoint.method_spec(m) for name, m in bctop.allocations.standard_methods().items()} == \
+        {name: checkpoint.method_spec(m) for name, m in bctop.allocations.standard_methods().items()}
+
+    expect_value_error(lambda: 0)
+    expect_value_error(Method(weighted=True, cost_method=lambda: 0))
+    expect_value_error(object())
+
+    unit = {'trial': 3, 'method': first, 'seed': 1, 'rtc_dist': {'family': 'triang', 'params': {'c': 0.2}}}
+    assert checkpoint.unit_key(**unit) == checkpoint.unit_key(**dict(unit))
+    assert checkpoint.unit_key(**unit) != checkpoint.unit_key(**dict(unit, trial=4))
+    assert checkpoint.unit_key(**unit) != checkpoint.unit_key(**dict(unit, rtc_dist={'family': 'uniform',
+                                                                                      'params': {'c': 0.2}}))
+
+
+def check_interrupted_save(root: str):
+    # A write that dies part way through leaves neither the result nor a temporary file behind.
+    class BrokenFrame(object):
+        def to_csv(self, outfile):
+            outfile.write('fid,GD_RBS\n10,')
+            raise InterruptedWrite()
+
+    store = checkpoint.ResultStore(root=root)
+    unit = {'trial': 99, 'method': 'RBS'}
+    key = checkpoint.unit_key(**unit)
+    try:
+        store.save(key, BrokenFrame(), unit)
+        raise AssertionError("Interrupted write was not raised")
+    except InterruptedWrite:
+        pass
+    assert not store.has(key)
+    assert not any(name.endswith('.tmp') for _, _, names in os.walk(root) for name in names)
+
+
+def check_trials(root: str):
+    store = checkpoint.ResultStore(root=root)
+    instance = instance_def.small_instance()
+    standard = bctop.allocations.standard_methods()
+    methods = {name: Counted(method=standard[name]) for name in ('RBS', 'CTOP', 'CMPR_RTC')}
+    trial_params = {'seed': 1, 'code': fullrun.code_fingerprint()}
+
+    units = fullrun.trial_units(methods, trial=0, postswap=False, trial_params=trial_params)
+    outframe = fullrun.run_trial(store, methods, units, postswap=False, **instance)
+    assert [len(m.calls) for m in methods.values()] == [1, 1, 1]
+    for unit in units.values():
+        assert store.load_record(checkpoint.unit_key(**unit)) == json.loads(checkpoint.unit_payload(**unit))
+
+    # The reassembled trial matches the frames computed directly, aligned on the flight index.
+    for name, m in methods.items():
+        expected = fullrun.method_frame(m.method(**instance), instance['flights'], name).astype(str)
+        assert outframe[expected.columns].loc[expected.index].equals(expected)
+    flight_frame = fullrun.flights_to_pd(instance['flights'])
+    assert outframe[flight_frame.columns].equals(flight_frame)
+
+    # A restart recomputes nothing and rebuilds the same trial.
+    rerun = fullrun.run_trial(store, methods, units, postswap=False, **instance)
+    assert [len(m.calls) for m in methods.values()] == [1, 1, 1]
+    assert rerun.equals(outframe)
+
+    # Changing one method's configuration recomputes only that method.
+    changed = dict(methods)
+    changed['CMPR_RTC'] = Counted(method=bctop.allocations.CtopRunner(
+        cost_method=bctop.allocations.cost_rtc, slotfiller=bctop.allocations.SlotFiller(compress=False)))
+    units = fullrun.trial_units(changed, trial=0, postswap=False, trial_params=trial_params)
+    fullrun.run_trial(store, changed, units, postswap=False, **instance)
+    assert [len(m.calls) for m in methods.values()] == [1, 1, 1]
+    assert len(changed['CMPR_RTC'].calls) == 1
+
+
+if __name__ == '__main__':
+    check_keys()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        check_interrupted_save(tmpdir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        check_trials(tmpdir)
+    print("checkpoint check passed")
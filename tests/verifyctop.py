@@ -7,23 +7,7 @@ import bctop.allocations
 import tests.instance_def
 
 instance = tests.instance_def.small_instance()
-methods = {'RBS': bctop.allocations.rbs,
-           'CTOP': bctop.allocations.CtopRunner(cost_method=bctop.allocations.cost_rtc,
-                                                slotfiller=bctop.allocations.SlotFiller(compress=False)),
-           'CMPR_RTC': bctop.allocations.CtopRunner(cost_method=bctop.allocations.cost_rtc,
-                                                    slotfiller=bctop.allocations.SlotFiller(compress=True)),
-           'CMPR_ONESTEP': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                        cost_method=bctop.allocations.CostCompr(weighted=False)),
-           'CMPR_W_ONESTEP': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                          cost_method=bctop.allocations.CostCompr(weighted=True)),
-           'CMPR_ASSIGN': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                       cost_method=bctop.allocations.CostAssign(weighted=False)),
-           'CMPR_WASSIGN': bctop.allocations.CtopRunner(slotfiller=bctop.allocations.SlotFiller(compress=True),
-                                                        cost_method=bctop.allocations.CostAssign(weighted=True)),
-
-           'SYSOPT': bctop.allocations.SysOpt(weighted=False),
-           'WSYSOPT': bctop.allocations.SysOpt(weighted=True)
-           }
+methods = bctop.allocations.standard_methods()
 
 for name, m in methods.items():
     print(name)
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import bctop.allocations
+import bctop.service
+import tests.instance_def
+
+LINE_LIMIT = 4096
+LATENCY_BOUND = 0.5
+
+
+def costs(assignment, flights):
+    return {'cost': bctop.service.assignment_cost(assignment, flights, weighted=False),
+            'wcost': bctop.service.assignment_cost(assignment, flights, weighted=True)}
+
+
+def to_ids(assignment):
+    return {str(f.fid): str(s.sid) for f, s in assignment.items()}
+
+
+async def raw_exchange(path: str, line: bytes):
+    reader, writer = await asyncio.open_unix_connection(path=path)
+    writer.write(line)
+    await writer.drain()
+    response = json.loads(await asyncio.wait_for(reader.readline(), timeout=5))
+    writer.close()
+    return response
+
+
+async def check_solver_methods(client, instance, rbs_result):
+    sysopt = bctop.allocations.SysOpt(weighted=True)(**instance)
+    swapped = bctop.allocations.apply_swaps(flights=instance['flights'],
+                                            assignments=bctop.allocations.rbs(**instance))
+
+    # Optimal assignments may tie, so compare the objective rather than the slots.
+    sysopt_result = await asyncio.wait_for(client.allocate('small', 'WSYSOPT'), timeout=30)
+    assert math.isclose(sysopt_result['wcost']['TOTALGDE'],
+                        costs(sysopt, instance['flights'])['wcost']['TOTALGDE'])
+
+    swap_result = await client.swap('small', rbs_result['assignment'])
+    assert set(swap_result['assignment'].values()) <= set(rbs_result['assignment'].values())
+    assert math.isclose(swap_result['wcost']['TOTALGDE'],
+                        costs(swapped, instance['flights'])['wcost']['TOTALGDE'])
+
+
+async def check_service(path: str):
+    instance = tests.instance_def.small_instance()
+    rbs = bctop.allocations.rbs(**instance)
+    cmpr_rtc = bctop.allocations.standard_methods()['CMPR_RTC'](**instance)
+
+    service = bctop.service.AllocationService(num_workers=2)
+    server = await service.start(path=path, limit=LINE_LIMIT)
+    try:
+        async with await bctop.service.AllocationClient.connect(path=path) as client:
+            loaded = await client.load_instance('small', **instance)
+            assert loaded == {'instance_id': 'small', 'num_slots': 5, 'num_flights': 5}
+
+            # Two requests in flight on the same connection must both come back to the right caller.
+            rbs_result, cmpr_result = await asyncio.wait_for(
+                asyncio.gather(client.allocate('small', 'RBS'), client.allocate('small', 'CMPR_RTC')), timeout=30)
+            assert rbs_result['assignment'] == to_ids(rbs)
+            assert cmpr_result['assignment'] == to_ids(cmpr_rtc)
+
+            start = time.perf_counter()
+            await client.allocate('small', 'RBS')
+            elapsed = time.perf_counter() - start
+            assert elapsed < LATENCY_BOUND, "Warm RBS allocation took " + str(elapsed) + "s"
+
+            evaluated = await client.evaluate('small', rbs_result['assignment'])
+            assert evaluated == costs(rbs, instance['flights'])
+
+            if bctop.allocations.grb is not None:
+                await check_solver_methods(client, instance, rbs_result)
+            else:
+                print("gurobipy is not installed; skipping solver-backed requests")
+
+            try:
+                await client.allocate('small', 'NOPE')
+                raise AssertionError("Unknown method was accepted")
+            except RuntimeError as e:
+                assert 'Unknown method' in str(e)
+
+            infeasible = dict(rbs_result['assignment'])
+            earliest = min(instance['slots'], key=lambda s: s.time)
+            latest_flight = max(instance['flights'], key=lambda f: f.ota())
+            infeasible[str(latest_flight.fid)] = str(earliest.sid)
+            try:
+                await client.evaluate('small', infeasible)
+                raise AssertionError("Infeasible assignment was accepted")
+            except RuntimeError as e:
+                assert 'ValueError' in str(e)
+
+        # Once the connection is gone the client fails fast instead of waiting for a reply.
+        try:
+            await asyncio.wait_for(client.allocate('small', 'RBS'), timeout=5)
+            raise AssertionError("Request on a closed client was accepted")
+        except ConnectionError:
+            pass
+        assert not client.futures
+
+        # Malformed and overlong lines still get exactly one error reply.
+        response = await raw_exchange(path, b'[1, 2, 3]\n')
+        assert response == {'id': None, 'ok': False, 'error': "Request must be a JSON object"}
+        response = await raw_exchange(path, b'{"op": "ping", "pad": "' + b'x' * LINE_LIMIT + b'"}\n')
+        assert response['id'] is None and not response['ok'] and 'too long' in response['error']
+    finally:
+        server.close()
+        await server.wait_closed()
+        service.close()
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmpdir:
+        asyncio.run(check_service(os.path.join(tmpdir, 'service.sock')))
+    print("service check passed")